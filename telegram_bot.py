@@ -1,12 +1,24 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import httpx
+import orjson
+import pybase64
+import redis.asyncio as redis
+from cachetools import TTLCache
 import asyncio
+import hashlib
+import html
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from PIL import Image
 import logging
 import io
 import os
+import random
+import re
+import time
+from contextlib import asynccontextmanager
 from typing import Optional, Dict
 
 # Configure logging
@@ -20,88 +32,212 @@ logger = logging.getLogger(__name__)
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN')
 OPENAI_KEY = os.environ.get('OPENAI_KEY')
 ANTHROPIC_KEY = os.environ.get('ANTHROPIC_KEY')
+# Optional, set by the Heroku Redis add-on; without it state stays in this process
+REDIS_URL = os.environ.get('REDIS_URL')
 
 # Validate environment variables
 if not all([TELEGRAM_TOKEN, OPENAI_KEY, ANTHROPIC_KEY]):
     logger.error("Missing required environment variables. Please check Heroku config vars.")
     raise ValueError("Missing required environment variables")
 
-# User State Storage
-user_states: Dict[int, Dict] = {}
+# Streaming progress: how often the preview is refreshed (characters and seconds) and how much of it is shown
+PREVIEW_STEP = 500
+PREVIEW_INTERVAL = 1.5
+PREVIEW_CHARS = 3500
+
+# Photos are downscaled to OpenAI's largest vision input size before upload
+MAX_IMAGE_SIDE = 1568
+JPEG_QUALITY = 85
+
+# Replies are split below Telegram's 4096-character limit and paced under its
+# per-chat rate limit of about one message per second
+TELEGRAM_CHUNK_SIZE = 3800
+CHUNK_SEND_INTERVAL = 1.0
+
+# Finished paragraphs are sent for translation once this much text has built up
+TRANSLATION_SECTION_SIZE = 1500
+
+# User State Storage: Redis when configured, otherwise in-process TTL caches.
+# Entries are grouped by namespace, each with its own lifetime in seconds.
+_STORE_TTLS = {
+    "img": 600,  # image waiting for the user's question
+    "ans": 86400,  # [english, georgian] answer for an (image, question) pair
+}
+# Heroku Redis serves rediss:// URLs with a self-signed certificate, so it cannot be verified
+_REDIS_OPTIONS = {"ssl_cert_reqs": None} if REDIS_URL and REDIS_URL.startswith("rediss://") else {}
+_R = redis.Redis.from_url(REDIS_URL, **_REDIS_OPTIONS) if REDIS_URL else None
+_local_store = {
+    namespace: TTLCache(maxsize=1000, ttl=ttl) for namespace, ttl in _STORE_TTLS.items()
+}
+# TTLCache only evicts on access, so idle caches are swept on this interval (seconds)
+STORE_SWEEP_INTERVAL = 60
+
+async def _store_get(namespace: str, key) -> Optional[bytes]:
+    """Return the stored value, or None if it is missing or expired."""
+    if _R is not None:
+        return await _R.get(f"{namespace}:{key}")
+    return _local_store[namespace].get(key)
+
+async def _store_set(namespace: str, key, value):
+    """Store a value for the namespace's lifetime."""
+    if _R is not None:
+        await _R.setex(f"{namespace}:{key}", _STORE_TTLS[namespace], value)
+    else:
+        _local_store[namespace][key] = value
+
+async def _store_delete(namespace: str, key) -> bool:
+    """Remove a value, returning whether one was stored."""
+    if _R is not None:
+        return await _R.delete(f"{namespace}:{key}") > 0
+    return _local_store[namespace].pop(key, None) is not None
+
+# LaTeX tokens and subscripts, matched in a single left-to-right pass
+_LATEX_REPLACEMENTS = {
+    '\\overrightarrow': '→',
+    '\\[': '',
+    '\\]': '',
+    '\\vec': '→',
+    '_1': '₁',
+    '_2': '₂',
+    '_3': '₃',
+    '_4': '₄',
+    '\\cdot': '·',
+    '\\times': '×',
+    '\\rightarrow': '→',
+    '\\leftarrow': '←',
+    '\\Rightarrow': '⇒',
+    '\\Leftarrow': '⇐',
+    '\\approx': '≈',
+    '\\neq': '≠',
+    '\\leq': '≤',
+    '\\geq': '≥',
+    '\\sqrt': '√',
+    '\\infty': '∞',
+    '\\pi': 'π',
+}
+
+def _trie_pattern(tokens):
+    """Build a regex alternation shaped like a prefix trie of the given tokens"""
+    branches = {}
+    for token in tokens:
+        if token:
+            branches.setdefault(token[0], []).append(token[1:])
+    alternatives = [re.escape(head) + _trie_pattern(tails) for head, tails in branches.items()]
+    if not alternatives:
+        return ''
+    # An empty alternative last lets a shorter token match once no longer one does
+    ends_here = '' in tokens
+    if len(alternatives) == 1 and not ends_here:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ('|' if ends_here else '') + ')'
+
+_LATEX_RE = re.compile(_trie_pattern(_LATEX_REPLACEMENTS))
+
+# Any backslash left over (escaped braces/parens, standalone or doubled backslashes) is dropped
+_STRIP_BACKSLASHES = str.maketrans('', '', '\\')
+
+# Leading/trailing whitespace of every line
+_LINE_PADDING_RE = re.compile(r'^[^\S\n]+|[^\S\n]+$', re.M)
+
+# Lines containing '=' that are not bullets or numbered steps
+_EQUATION_LINE_RE = re.compile(r'^(?![•\-]|[1-9]\.)(.*=.*)$', re.M)
 
 def format_math_text(text):
     """Format mathematical text to be more readable"""
-    replacements = {
-        '\\\\': '\\',  # Handle double backslashes first
-        '\\overrightarrow': '→',
-        '\\[': '',
-        '\\]': '',
-        '\\vec': '→',
-        '_1': '₁',
-        '_2': '₂',
-        '_3': '₃',
-        '_4': '₄',
-        '\\{': '{',
-        '\\}': '}',
-        '\\cdot': '·',
-        '\\times': '×',
-        '\\rightarrow': '→',
-        '\\leftarrow': '←',
-        '\\Rightarrow': '⇒',
-        '\\Leftarrow': '⇐',
-        '\\approx': '≈',
-        '\\neq': '≠',
-        '\\leq': '≤',
-        '\\geq': '≥',
-        '\\sqrt': '√',
-        '\\infty': '∞',
-        '\\pi': 'π',
-        ' \\': ' ',  # Remove standalone backslashes
-        '\\(': '(',
-        '\\)': ')',
-    }
-    
-    # First pass: handle basic replacements
-    for old, new in replacements.items():
-        text = text.replace(old, new)
+    # First pass: handle LaTeX commands and subscripts
+    text = _LATEX_RE.sub(lambda m: _LATEX_REPLACEMENTS[m.group(0)], text)
     
-    # Second pass: clean up any remaining single backslashes
-    text = text.replace('\\', '')
+    # Second pass: clean up any remaining backslashes
+    text = text.translate(_STRIP_BACKSLASHES)
     
     # Handle special cases for vector notation
     text = text.replace('M1', 'M₁').replace('M2', 'M₂')
     
-    # Add proper line breaks for equations
-    lines = text.split('\n')
-    formatted_lines = []
-    for line in lines:
-        line = line.strip()
-        if '=' in line and not line.startswith(('•', '-', '1.', '2.', '3.', '4.', '5.', '6.', '7.', '8.', '9.')):
-            formatted_lines.append(f'```{line}```')
-        else:
-            formatted_lines.append(line)
+    # Escape for Telegram's HTML parse mode
+    text = html.escape(text, quote=False)
     
-    return '\n'.join(formatted_lines)
+    # Add proper line breaks for equations
+    text = _LINE_PADDING_RE.sub('', text)
+    return _EQUATION_LINE_RE.sub(r'<pre>\1</pre>', text)
 
-async def analyze_image_with_openai(image_data: bytes, question: str):
-    try:
-        import base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {OPENAI_KEY}"
-        }
-        
-        payload = {
-            "model": "gpt-4o",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": f'''You are a professional student helper. Here i am sending a photo of the topic/problem. Please analyze the topic/problem and anwer the question.It can be any topic (math, logics, biology, any topic) Be as informative as possible and follow this guidlines:
+# Shared HTTP client, keeps connections to the API hosts alive between requests
+_HTTP = httpx.AsyncClient(
+    http2=True,
+    timeout=30.0,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+)
+
+# Upstream concurrency caps and retry policy
+_OPENAI_SEM = asyncio.Semaphore(8)
+_CLAUDE_SEM = asyncio.Semaphore(8)
+MAX_RETRIES = 5
+MAX_RETRY_DELAY = 30.0
+_RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+
+# Per-URL monotonic time before which no new request is sent after a rate limit
+_resume_at: Dict[str, float] = {}
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying, honouring the Retry-After header up to MAX_RETRY_DELAY."""
+    retry_after = response.headers.get("retry-after")
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), MAX_RETRY_DELAY)
+        except ValueError:
+            pass
+    return 2 ** attempt * 0.5 + random.random() * 0.1
+
+async def _wait_for_rate_limit(url: str):
+    """Sleep until a rate limit reported for this URL has passed."""
+    wait = _resume_at.get(url, 0.0) - time.monotonic()
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+async def _back_off(url: str, response: httpx.Response, attempt: int):
+    """Wait before retrying a failed request."""
+    delay = _retry_delay(response, attempt)
+    logger.warning(f"{url} returned {response.status_code}, retrying in {delay:.1f}s")
+    if response.status_code == 429:
+        # Hold back every caller of this API, the wait happens before the next attempt
+        _resume_at[url] = max(_resume_at.get(url, 0.0), time.monotonic() + delay)
+    else:
+        await asyncio.sleep(delay)
+
+async def _post_with_retry(url: str, semaphore: asyncio.Semaphore, **kwargs) -> httpx.Response:
+    """POST to an upstream API, backing off on rate limits and server errors."""
+    async with semaphore:
+        for attempt in range(MAX_RETRIES):
+            await _wait_for_rate_limit(url)
+            response = await _HTTP.post(url, **kwargs)
+            if response.status_code not in _RETRY_STATUSES or attempt == MAX_RETRIES - 1:
+                return response
+            await _back_off(url, response, attempt)
+
+@asynccontextmanager
+async def _stream_with_retry(url: str, semaphore: asyncio.Semaphore, **kwargs):
+    """Open a streaming POST to an upstream API, retrying like _post_with_retry."""
+    async with semaphore:
+        for attempt in range(MAX_RETRIES):
+            await _wait_for_rate_limit(url)
+            async with _HTTP.stream("POST", url, **kwargs) as response:
+                if response.status_code not in _RETRY_STATUSES or attempt == MAX_RETRIES - 1:
+                    yield response
+                    return
+                await response.aread()
+            await _back_off(url, response, attempt)
+
+# OpenAI request constants
+OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+_OPENAI_HEADERS = {
+    "Content-Type": "application/json",
+    "Authorization": f"Bearer {OPENAI_KEY}"
+}
+_OPENAI_BASE_PAYLOAD = {
+    "model": "gpt-4o",
+    "max_tokens": 10000,
+    "stream": True
+}
+_OPENAI_PROMPT_PREFIX = '''You are a professional student helper. Here i am sending a photo of the topic/problem. Please analyze the topic/problem and anwer the question.It can be any topic (math, logics, biology, any topic) Be as informative as possible and follow this guidlines:
 1. Start with a clear statement of what we're solving
 2. Break down the solution into numbered steps
 3. If it's math, Put each mathematical equation on a new line. If it's not - place paragraphs on new lines.
@@ -113,32 +249,86 @@ async def analyze_image_with_openai(image_data: bytes, question: str):
 9. End with a clear conclusion
 10. Provide a detailed theoretical materials so that students can learn the topic. Be as useful as possible. Your descriptions must be simple and understadnable.
 
-Question: {question}'''
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 10000
-        }
+Question: '''
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            
+# The request body is assembled around the prompt and the base64 image, so the
+# multi-megabyte image string is copied into the body only once
+_OPENAI_BODY_HEAD = (
+    orjson.dumps(_OPENAI_BASE_PAYLOAD)[:-1]
+    + b',"messages":[{"role":"user","content":[{"type":"text","text":'
+)
+_OPENAI_BODY_IMAGE = b'},{"type":"image_url","image_url":{"url":"data:image/jpeg;base64,'
+_OPENAI_BODY_TAIL = b'"}}]}]}'
+
+# Claude request constants
+CLAUDE_URL = "https://api.anthropic.com/v1/messages"
+_CLAUDE_HEADERS = {
+    "Content-Type": "application/json",
+    "x-api-key": ANTHROPIC_KEY,
+    "anthropic-version": "2023-06-01"
+}
+_CLAUDE_BASE_PAYLOAD = {
+    "model": "claude-3-5-sonnet-20241022",
+    "max_tokens": 4000
+}
+_CLAUDE_PROMPT_PREFIX = '''Please translate this mathematical solution to Georgian, maintaining the following:
+1. Keep all mathematical formulas, symbols, and numbers exactly as they are
+2. Keep all vector notations (→) unchanged
+3. Preserve line breaks, especially for equations
+4. Keep step numbers and formatting intact
+5. Translate only the explanatory text
+6. Preserve all mathematical notation exactly as shown
+
+Text to translate:
+'''
+
+def shrink_image(image_data: bytes) -> bytes:
+    """Downscale an image to MAX_IMAGE_SIDE and re-encode it as JPEG."""
+    with Image.open(io.BytesIO(image_data)) as img:
+        if max(img.size) <= MAX_IMAGE_SIDE:
+            return image_data
+        img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+        out = io.BytesIO()
+        img.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        return out.getvalue()
+
+async def analyze_image_with_openai(image_data: bytes, question: str):
+    """Stream the answer from OpenAI, yielding text as it is generated."""
+    try:
+        body = b''.join((
+            _OPENAI_BODY_HEAD,
+            orjson.dumps(_OPENAI_PROMPT_PREFIX + question),
+            _OPENAI_BODY_IMAGE,
+            pybase64.b64encode(image_data),
+            _OPENAI_BODY_TAIL
+        ))
+
+        async with _stream_with_retry(
+            OPENAI_URL,
+            _OPENAI_SEM,
+            headers=_OPENAI_HEADERS,
+            content=body
+        ) as response:
             if response.status_code != 200:
+                await response.aread()
                 raise Exception(f"OpenAI API error: {response.text}")
-                
-            data = response.json()
-            return data['choices'][0]['message']['content']
+            
+            # Server-sent events: "data: {...}" per chunk, each ended by a blank line,
+            # and "data: [DONE]" at the end. Events are scanned straight from the raw bytes.
+            buf = bytearray()
+            async for chunk in response.aiter_bytes():
+                buf += chunk
+                start = 0
+                while (end := buf.find(b'\n\n', start)) != -1:
+                    if buf.startswith(b'data: ', start, end):
+                        data = buf[start + 6:end]
+                        if data == b'[DONE]':
+                            return
+                        choices = orjson.loads(data)['choices']
+                        if choices and choices[0]['delta'].get('content'):
+                            yield choices[0]['delta']['content']
+                    start = end + 2
+                del buf[:start]
 
     except Exception as e:
         logger.error(f"Error in analyze_image_with_openai: {str(e)}")
@@ -146,49 +336,123 @@ Question: {question}'''
 
 async def translate_with_claude(text: str):
     try:
-        headers = {
-            "Content-Type": "application/json",
-            "x-api-key": ANTHROPIC_KEY,
-            "anthropic-version": "2023-06-01"
-        }
-        
         payload = {
-            "model": "claude-3-5-sonnet-20241022",
-            "max_tokens": 4000,
+            **_CLAUDE_BASE_PAYLOAD,
             "messages": [
                 {
                     "role": "user",
-                    "content": f'''Please translate this mathematical solution to Georgian, maintaining the following:
-1. Keep all mathematical formulas, symbols, and numbers exactly as they are
-2. Keep all vector notations (→) unchanged
-3. Preserve line breaks, especially for equations
-4. Keep step numbers and formatting intact
-5. Translate only the explanatory text
-6. Preserve all mathematical notation exactly as shown
-
-Text to translate:
-{text}'''
+                    "content": _CLAUDE_PROMPT_PREFIX + text
                 }
             ]
         }
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers=headers,
-                json=payload
-            )
+        response = await _post_with_retry(
+            CLAUDE_URL,
+            _CLAUDE_SEM,
+            headers=_CLAUDE_HEADERS,
+            content=orjson.dumps(payload)
+        )
+        
+        if response.status_code != 200:
+            raise Exception(f"Claude API error: {response.text}")
             
-            if response.status_code != 200:
-                raise Exception(f"Claude API error: {response.text}")
-                
-            data = response.json()
-            return data['content'][0]['text']
+        data = orjson.loads(response.content)
+        return data['content'][0]['text']
 
     except Exception as e:
         logger.error(f"Error in translate_with_claude: {str(e)}")
         raise
 
+async def sweep_local_store():
+    """Drop expired entries from the in-process caches, freeing abandoned images."""
+    while True:
+        await asyncio.sleep(STORE_SWEEP_INTERVAL)
+        for cache in _local_store.values():
+            cache.expire()
+
+async def start_background_tasks(application: Application):
+    """Start the in-process cache sweeper when Redis is not configured."""
+    if _R is None:
+        application.bot_data["sweeper"] = asyncio.create_task(sweep_local_store())
+
+async def close_clients(application: Application):
+    """Stop background tasks and close the shared HTTP and Redis clients when the bot shuts down."""
+    sweeper = application.bot_data.pop("sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+    await _HTTP.aclose()
+    if _R is not None:
+        await _R.aclose()
+
+# Markup produced by format_math_text and the answer headers
+_HTML_TAG_RE = re.compile(r'</?(?:pre|b)>')
+
+def _hard_cut(text: str, limit: int):
+    """Cut formatted text at limit without splitting a tag, an entity or a <pre> block."""
+    cut = limit
+    # Finish a closing tag the cut lands in, reopening a block with nothing left would leave it empty
+    start = text.rfind('<', 0, cut + 1)
+    if start >= 0 and text.startswith('</', start) and text.find('>', start, cut) == -1:
+        cut = text.find('>', start) + 1
+    # Back off over a partial tag or entity such as "&amp;"
+    for opener, closer in (('<', '>'), ('&', ';')):
+        start = text.rfind(opener, 0, cut)
+        if start > 0 and text.find(closer, start, cut) == -1:
+            cut = start
+    # Leave a <pre> opened right at the cut for the next chunk
+    if text.endswith('<pre>', 0, cut):
+        cut -= len('<pre>')
+    head, rest = text[:cut], text[cut:]
+    # Close a <pre> block left open by the cut and reopen it in the next chunk
+    if head.rfind('<pre>') > head.rfind('</pre>'):
+        head += '</pre>'
+        rest = '<pre>' + rest
+    return head, rest
+
+def split_message(text: str, limit: int = TELEGRAM_CHUNK_SIZE) -> list:
+    """Split text into chunks of at most limit characters, preferring paragraph and line breaks."""
+    chunks = []
+    while len(text) > limit:
+        cut = text.rfind('\n\n', 0, limit)
+        if cut <= 0:
+            cut = text.rfind('\n', 0, limit)
+        if cut > 0:
+            head, rest = text[:cut], text[cut:]
+        else:
+            # Leave room for a closing </pre>
+            head, rest = _hard_cut(text, limit - len('</pre>'))
+        chunks.append(head)
+        text = rest.lstrip('\n')
+    if text:
+        chunks.append(text)
+    return chunks
+
+async def _send_chunk(message, chunk: str):
+    """Reply with one chunk, falling back to plain text if Telegram rejects the markup."""
+    try:
+        await message.reply_text(chunk, parse_mode='HTML')
+    except BadRequest as e:
+        # Telegram could not parse the markup, send the chunk without it
+        logger.warning(f"Sending chunk as plain text: {str(e)}")
+        await message.reply_text(html.unescape(_HTML_TAG_RE.sub('', chunk)))
+
+async def send_chunks(message, header: str, text: str):
+    """Reply with the header and text, split across as many messages as needed."""
+    # Split the text alone so the header's own blank line is never used as a cut
+    chunks = split_message(text, TELEGRAM_CHUNK_SIZE - len(header)) or ['']
+    chunks[0] = header + chunks[0]
+    for i, chunk in enumerate(chunks):
+        if i:
+            await asyncio.sleep(CHUNK_SEND_INTERVAL)
+        while True:
+            try:
+                await _send_chunk(message, chunk)
+                break
+            except RetryAfter as e:
+                # Rate limited, wait as long as Telegram asks and send the same chunk again
+                logger.warning(f"Rate limited by Telegram, resending chunk in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
     user_id = update.effective_user.id
@@ -227,8 +491,17 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancel the current operation."""
     user_id = update.effective_user.id
-    if user_id in user_states:
-        del user_states[user_id]
+    try:
+        cancelled = await _store_delete("img", user_id)
+    except redis.RedisError as e:
+        logger.error(f"Error cancelling operation: {str(e)}")
+        await update.message.reply_text(
+            "Sorry, there was an error cancelling the operation. "
+            "Please try again."
+        )
+        return
+    
+    if cancelled:
         await update.message.reply_text("Operation cancelled. You can start again by sending a new image.")
     else:
         await update.message.reply_text("No active operation to cancel.")
@@ -241,15 +514,17 @@ async def handle_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Get the largest available photo
         photo = max(update.message.photo, key=lambda x: x.file_size)
         
-        # Download the photo
+        # Download the photo, getvalue() hands over the buffer without copying it
         file = await context.bot.get_file(photo.file_id)
-        f = io.BytesIO()
-        await file.download_to_memory(f)
+        buf = io.BytesIO()
+        await file.download_to_memory(buf)
+        image_data = buf.getvalue()
+        
+        # Shrink it off the event loop, Pillow releases the GIL while resizing
+        image_data = await asyncio.to_thread(shrink_image, image_data)
         
         # Store the image data in user state
-        user_states[user_id] = {
-            "image_data": f.getvalue()
-        }
+        await _store_set("img", user_id, image_data)
         
         await update.message.reply_text(
             "Image received! 🖼\n"
@@ -263,16 +538,71 @@ async def handle_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Please try sending it again."
         )
 
+def answer_cache_key(image_data: bytes, question: str) -> str:
+    """Key identifying an (image, question) pair in the answer cache."""
+    key = hashlib.blake2b(image_data, digest_size=16)
+    key.update(question.encode())
+    return key.hexdigest()
+
+async def update_status(message, text: str):
+    """Edit the progress message, ignoring Telegram errors such as rate limits."""
+    try:
+        await message.edit_text(text)
+    except TelegramError as e:
+        logger.warning(f"Could not update progress message: {str(e)}")
+
+async def stream_answer(image_data: bytes, question: str, processing_message, translations: list) -> str:
+    """Stream the English answer, appending a translation task for each finished section."""
+    english_answer = ''
+    translated_upto = 0
+    previewed = 0
+    previewed_at = time.monotonic()
+    async for delta in analyze_image_with_openai(image_data, question):
+        english_answer += delta
+        
+        boundary = english_answer.rfind('\n\n', translated_upto)
+        if boundary - translated_upto >= TRANSLATION_SECTION_SIZE:
+            section = english_answer[translated_upto:boundary]
+            translations.append(asyncio.create_task(translate_with_claude(section)))
+            translated_upto = boundary + 2
+        
+        if (len(english_answer) - previewed >= PREVIEW_STEP
+                and time.monotonic() - previewed_at >= PREVIEW_INTERVAL):
+            previewed = len(english_answer)
+            previewed_at = time.monotonic()
+            await update_status(
+                processing_message,
+                "Writing the English solution... ⏳\n\n"
+                f"{english_answer[-PREVIEW_CHARS:]}"
+            )
+    
+    remainder = english_answer[translated_upto:]
+    if remainder.strip():
+        translations.append(asyncio.create_task(translate_with_claude(remainder)))
+    
+    return english_answer
+
 async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text messages (questions about the image)."""
     user_id = update.effective_user.id
     
-    if user_id not in user_states or "image_data" not in user_states[user_id]:
+    try:
+        image_data = await _store_get("img", user_id)
+    except redis.RedisError as e:
+        logger.error(f"Error loading image: {str(e)}")
+        await update.message.reply_text(
+            "Sorry, there was an error processing your request. "
+            "Please try again or send a new image."
+        )
+        return
+    
+    if image_data is None:
         await update.message.reply_text(
             "Please send an image of your math problem first before asking a question."
         )
         return
     
+    translations = []
     try:
         # Send "processing" message
         processing_message = await update.message.reply_text(
@@ -280,57 +610,82 @@ async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "This might take a few seconds."
         )
         
-        # Get image data and question
-        image_data = user_states[user_id]["image_data"]
+        # Get question
         question = update.message.text
         
-        # Analyze image
-        english_answer = await analyze_image_with_openai(image_data, question)
-        formatted_english = format_math_text(english_answer)
+        # Serve repeated questions about the same image from the cache
+        cache_key = answer_cache_key(image_data, question)
+        try:
+            cached = await _store_get("ans", cache_key)
+        except redis.RedisError as e:
+            # The cache is only an optimisation, treat a failed read as a miss
+            logger.warning(f"Error reading cached answer: {str(e)}")
+            cached = None
+        if cached is not None:
+            english_answer, georgian_answer = orjson.loads(cached)
+        else:
+            english_answer = await stream_answer(image_data, question, processing_message, translations)
+            georgian_answer = None
+        
+        formatted_english = await asyncio.to_thread(format_math_text, english_answer)
         
         # Send English response first
-        await update.message.reply_text(
-            "🇬🇧 *English Solution:*\n\n"
-            f"{formatted_english}",
-            parse_mode='Markdown'
-        )
+        await send_chunks(update.message, "🇬🇧 <b>English Solution:</b>\n\n", formatted_english)
         
         # Update processing message
-        await processing_message.edit_text(
+        await update_status(
+            processing_message,
             "English solution complete ✅\n"
             "Now translating to Georgian... ⏳"
         )
         
-        # Translate to Georgian
-        georgian_answer = await translate_with_claude(english_answer)
-        formatted_georgian = format_math_text(georgian_answer)
+        # Collect the Georgian translation
+        if georgian_answer is None:
+            georgian_answer = '\n\n'.join(await asyncio.gather(*translations))
+            try:
+                await _store_set("ans", cache_key, orjson.dumps([english_answer, georgian_answer]))
+            except redis.RedisError as e:
+                logger.warning(f"Error caching answer: {str(e)}")
+        formatted_georgian = await asyncio.to_thread(format_math_text, georgian_answer)
         
         # Send Georgian response
-        await update.message.reply_text(
-            "🇬🇪 *ქართული ამოხსნა:*\n\n"
-            f"{formatted_georgian}",
-            parse_mode='Markdown'
-        )
-        
-        # Clean up user state
-        del user_states[user_id]
+        await send_chunks(update.message, "🇬🇪 <b>ქართული ამოხსნა:</b>\n\n", formatted_georgian)
         
         # Update processing message
-        await processing_message.edit_text("✅ Solution complete!")
+        await update_status(processing_message, "✅ Solution complete!")
         
     except Exception as e:
         logger.error(f"Error processing question: {str(e)}")
+        for task in translations:
+            task.cancel()
         await update.message.reply_text(
             "Sorry, there was an error processing your request. "
             "Please try again or send a new image."
         )
-        if user_id in user_states:
-            del user_states[user_id]
+    finally:
+        # Clean up user state whether or not the request succeeded
+        try:
+            await _store_delete("img", user_id)
+        except redis.RedisError as e:
+            logger.error(f"Error cleaning up user state: {str(e)}")
 
 def main():
     """Start the bot."""
+    # Run on uvloop where it is available (it does not support Windows)
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        logger.info("uvloop not available, using the default asyncio event loop")
+
     # Create the Application
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .post_init(start_background_tasks)
+        .post_shutdown(close_clients)
+        .build()
+    )
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))